@@ -1,12 +1,80 @@
+"""
+Module to handle artist information commands in the Telegram bot.
+
+Artist lookups combine the artist's YouTube channel with a short GPT-generated bio.
+Both results are cached on disk, so repeated lookups of popular artists spend no
+YouTube quota and no OpenAI tokens.
+"""
+import os
+import re
+import asyncio
 import logging
+import openai
 from telegram import Update
 from telegram.ext import CallbackContext
-# Add any other necessary imports for artist_handlers functionality
+from dotenv import load_dotenv
+from cache_utils import PersistentCache
+from googleapiclient.errors import HttpError
+from youtube_quota import ledger, QUOTA_EXHAUSTED_TEXT
+
+load_dotenv()
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+PP_OPENAI_ENGINE = os.getenv('PP_OPENAI_ENGINE', 'gpt-4')
+PP_ARTIST_PROMPT = os.getenv(
+    'PP_ARTIST_PROMPT',
+    'Write a short biography of the following music artist:'
+)
+PP_ARTIST_CACHE_FILE = os.getenv('PP_ARTIST_CACHE_FILE', 'artist_cache.pickle')
+PP_ARTIST_BIO_CACHE_FILE = os.getenv('PP_ARTIST_BIO_CACHE_FILE', 'artist_bio_cache.pickle')
+PP_ARTIST_CACHE_TTL = int(os.getenv('PP_ARTIST_CACHE_TTL', str(7 * 24 * 3600)))
+
+# Normalized artist name -> {'channel_id': ..., 'snippet': ...} or None when not found
+artist_cache = PersistentCache(PP_ARTIST_CACHE_FILE, PP_ARTIST_CACHE_TTL)
+# Normalized artist name -> GPT-generated bio
+bio_cache = PersistentCache(PP_ARTIST_BIO_CACHE_FILE, PP_ARTIST_CACHE_TTL)
+_NOT_CACHED = object()
+
+def normalize_artist_name(artist_name):
+    """
+    Normalizes an artist name so that different spellings share a cache entry.
+
+    Args:
+        artist_name (str): The artist name as typed by the user.
+
+    Returns:
+        str: The name case-folded with whitespace collapsed.
+    """
+    return re.sub(r'\s+', ' ', artist_name).strip().casefold()
+
+def format_channel_info(channel):
+    """
+    Formats cached channel information as a human readable description.
+
+    Args:
+        channel (dict or None): The cached channel entry.
+
+    Returns:
+        str: The description of the artist channel.
+    """
+    if not channel:
+        return "No information found for the artist on YouTube."
+    snippet = channel['snippet']
+    return f"Artist Channel: {snippet['title']}\nDescription: {snippet['description']}"
+
 def youtube_info(artist_name, get_authenticated_service):
+    key = normalize_artist_name(artist_name)
+    channel = artist_cache.get(key, _NOT_CACHED)
+    if channel is not _NOT_CACHED:
+        logger.info("Artist cache hit for %s", key)
+        return format_channel_info(channel)
+
+    # search.list costs 100 units, do not cache the refusal so it is retried later
+    if not ledger.spend('search.list'):
+        return QUOTA_EXHAUSTED_TEXT
+
     try:
         youtube = get_authenticated_service()
         # Search for the artist on YouTube
@@ -18,28 +86,71 @@ def youtube_info(artist_name, get_authenticated_service):
         )
         response = request.execute()
 
+        channel = None
         if response['items']:
-            artist_channel_info = response['items'][0]['snippet']
-            description = f"Artist Channel: {artist_channel_info['title']}\nDescription: {artist_channel_info['description']}"
-            return description
-        else:
-            return "No information found for the artist on YouTube."
+            item = response['items'][0]
+            channel = {
+                'channel_id': item['id']['channelId'],
+                'snippet': item['snippet']
+            }
+        # Cache misses too, so unknown names do not keep spending quota
+        artist_cache.set(key, channel)
+        return format_channel_info(channel)
+    except HttpError as e:
+        logger.error("Error fetching artist information from YouTube: %s", e)
+        if ledger.record_http_error(e):
+            return QUOTA_EXHAUSTED_TEXT
+        return "An error occurred while fetching information from YouTube."
     except Exception as e:
-        logger.error(f"Error fetching artist information from YouTube: {e}")
+        logger.error("Error fetching artist information from YouTube: %s", e)
         return "An error occurred while fetching information from YouTube."
 
+def artist_bio(artist_name):
+    """
+    Generates a short bio of the artist using OpenAI's GPT model.
+
+    The generated bio is cached by normalized artist name.
+
+    Args:
+        artist_name (str): The name of the artist.
+
+    Returns:
+        str: The bio, or an error message.
+    """
+    key = normalize_artist_name(artist_name)
+    bio = bio_cache.get(key)
+    if bio is not None:
+        logger.info("Bio cache hit for %s", key)
+        return bio
+
+    try:
+        response = openai.Completion.create(
+            engine=PP_OPENAI_ENGINE,
+            prompt=f"{PP_ARTIST_PROMPT}\n\n{artist_name}\n\n",
+            max_tokens=200,
+            temperature=0.5
+        )
+        if not response.choices:
+            return "No bio available."
+        bio = response.choices[0].text.strip()
+        bio_cache.set(key, bio)
+        return bio
+    except openai.error.OpenAIError as e:
+        logger.error("OpenAI API error: %s", e)
+        return "An error occurred while generating the artist bio."
+
 async def get_artist(update: Update, context: CallbackContext, get_authenticated_service):
     artist_name = ' '.join(context.args)
     if not artist_name:
         await update.message.reply_text("Please provide an artist name.")
         return
 
-    youtube_artist_info = youtube_info(artist_name, get_authenticated_service)
-    logger.info(f"Retrieved YouTube information for {artist_name}")
-
-    # Combine this information with other sources and OpenAI's response (to be implemented)
-    # ...
-
-    await update.message.reply_text(youtube_artist_info)
+    # Both lookups are blocking calls, run them concurrently in the default executor
+    loop = asyncio.get_running_loop()
+    youtube_artist_info, bio = await asyncio.gather(
+        loop.run_in_executor(None, youtube_info, artist_name, get_authenticated_service),
+        loop.run_in_executor(None, artist_bio, artist_name)
+    )
+    logger.info("Retrieved artist information for %s", artist_name)
 
-# You can add more functions related to artist information handling here
+    await update.message.reply_text(f"{youtube_artist_info}\n\n{bio}")
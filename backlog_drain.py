@@ -0,0 +1,173 @@
+"""
+backlog_drain.py
+
+This module drains the Telegram updates that piled up while the bot was down.
+It runs once per start of the polling loop, before regular polling begins: the
+whole backlog is fetched in bulk and confirmed, updates older than a configurable
+age are dropped, repeated expensive requests in the same chat are collapsed into
+one, and the remaining updates are processed concurrently across chats with
+bounded parallelism. Updates of a single chat keep their order.
+
+Functions:
+    drain_backlog(application): Fetches, filters and processes pending updates.
+"""
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from telegram.error import TelegramError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PP_BACKLOG_MAX_AGE = int(os.getenv('PP_BACKLOG_MAX_AGE', '300'))
+PP_BACKLOG_CONCURRENCY = int(os.getenv('PP_BACKLOG_CONCURRENCY', '8'))
+
+# Commands whose repeated calls in one chat are answered only once
+COLLAPSIBLE_COMMANDS = {'/news'}
+FALLACY_EMOJI = '\U0001F914'
+
+async def fetch_backlog(bot):
+    """
+    Fetches every pending update and confirms it with Telegram.
+
+    Each call to getUpdates with an offset confirms all updates before that offset,
+    so the regular polling started afterwards does not receive them again. If a call
+    fails, e.g. with Conflict while the previous instance is still polling, the
+    updates fetched so far are returned; the rest is left to regular polling.
+
+    Args:
+        bot (telegram.Bot): The bot used to call getUpdates.
+
+    Returns:
+        list: The pending updates, oldest first.
+    """
+    updates = []
+    offset = None
+    while True:
+        try:
+            batch = await bot.get_updates(offset=offset, limit=100, timeout=0)
+        except TelegramError as e:
+            logger.error("Could not fetch the update backlog: %s", e)
+            return updates
+        if not batch:
+            return updates
+        updates.extend(batch)
+        offset = batch[-1].update_id + 1
+
+def is_stale(update, now):
+    """
+    Tells whether an update is older than the configured maximum age.
+
+    Args:
+        update (Update): The pending update.
+        now (datetime): The current time, timezone aware.
+
+    Returns:
+        bool: True if the update should be dropped.
+    """
+    # Inline queries expire within seconds, there is no point in answering them late
+    if update.inline_query is not None:
+        return True
+    message = update.effective_message
+    if message is None or message.date is None:
+        return False
+    return (now - message.date).total_seconds() > PP_BACKLOG_MAX_AGE
+
+def collapse_key(update):
+    """
+    Returns the key under which duplicate expensive requests are collapsed.
+
+    Repeated /news commands in a chat share a key, as do repeated fallacy requests
+    replying to the same message. Other updates are never collapsed.
+
+    Args:
+        update (Update): The pending update.
+
+    Returns:
+        tuple or None: The collapse key, or None if the update is unique.
+    """
+    message = update.message
+    if message is None or not message.text:
+        return None
+    parts = message.text.split(maxsplit=1)
+    if not parts:
+        return None
+    command = parts[0].split('@')[0].lower()
+    if command in COLLAPSIBLE_COMMANDS:
+        return (message.chat_id, command)
+    if FALLACY_EMOJI in message.text and message.reply_to_message:
+        return (message.chat_id, FALLACY_EMOJI, message.reply_to_message.message_id)
+    return None
+
+def filter_backlog(updates):
+    """
+    Drops stale updates and keeps only the latest update of each collapse key.
+
+    Args:
+        updates (list): The pending updates, oldest first.
+
+    Returns:
+        OrderedDict: Chat ID to the list of updates to process, oldest first.
+    """
+    now = datetime.now(timezone.utc)
+    latest = {}
+    for update in updates:
+        key = collapse_key(update)
+        if key is not None:
+            latest[key] = update.update_id
+
+    per_chat = OrderedDict()
+    stale = collapsed = 0
+    for update in updates:
+        if is_stale(update, now):
+            stale += 1
+            continue
+        key = collapse_key(update)
+        if key is not None and latest[key] != update.update_id:
+            collapsed += 1
+            continue
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        per_chat.setdefault(chat_id, []).append(update)
+
+    logger.info("Backlog: %d updates, %d stale, %d collapsed.", len(updates), stale, collapsed)
+    return per_chat
+
+async def drain_backlog(application):
+    """
+    Drains the pending updates before regular polling starts.
+
+    Called from the application's post_init callback, so it runs on every
+    (re)start of run_polling.
+
+    Args:
+        application (Application): The initialized Telegram application.
+    """
+    updates = await fetch_backlog(application.bot)
+    if not updates:
+        return
+
+    try:
+        per_chat = filter_backlog(updates)
+    except Exception as e:
+        # The updates are already confirmed, process them all in order rather than lose them
+        logger.error("Error while filtering backlog, processing it unfiltered: %s", e)
+        per_chat = {None: updates}
+    semaphore = asyncio.Semaphore(PP_BACKLOG_CONCURRENCY)
+
+    async def process_chat(chat_updates):
+        async with semaphore:
+            for update in chat_updates:
+                await application.process_update(update)
+
+    results = await asyncio.gather(
+        *(process_chat(chat_updates) for chat_updates in per_chat.values()),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Error while draining backlog: %s", result)
+    logger.info("Backlog drained for %d chats.", len(per_chat))
@@ -9,6 +9,8 @@ to be reusable and are used by various handlers and commands in the bot's workfl
 Functions:
     send_reply(update: Update, context, text: str): Asynchronously sends a reply 
     to a Telegram message based on the chat type and configuration.
+    send_to_chat(bot, chat_id: int, text: str, parse_mode): Asynchronously sends a
+    message to a chat without an incoming update, e.g. for scheduled messages.
 """
 import logging
 import os
@@ -61,3 +63,34 @@ async def send_reply(update: Update, context, text: str):
             disable_web_page_preview=True
         )
         logger.info("Sent public reply.")
+
+async def send_to_chat(bot, chat_id: int, text: str, parse_mode=ParseMode.MARKDOWN):
+    """
+    Sends a message to a chat that is not replying to any incoming update.
+
+    This asynchronous function is used for messages initiated by the bot itself, such
+    as scheduled digests. It uses the same formatting as send_reply and follows the
+    same policy: nothing is sent to private chats unless PP_REPLY_TO_PRIVATE is set.
+    Private chats are recognized by their positive ID, group and channel IDs are
+    negative.
+
+    Args:
+        bot (telegram.Bot): The bot used to send the message.
+        chat_id (int): The ID of the destination chat.
+        text (str): The text to be sent.
+        parse_mode (str): The Telegram parse mode, or None to send plain text.
+
+    Returns:
+        None: This function sends a message but does not return any value.
+    """
+    if chat_id > 0 and not PP_REPLY_TO_PRIVATE:
+        logger.info("Not messaging private chat %s as PP_REPLY_TO_PRIVATE is False.", chat_id)
+        return
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        parse_mode=parse_mode,
+        disable_web_page_preview=True
+    )
+    logger.info("Sent message to chat %s.", chat_id)
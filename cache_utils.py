@@ -0,0 +1,116 @@
+"""
+cache_utils.py
+
+This module provides a small persistent key-value cache used by the bot to avoid
+repeating expensive upstream calls (YouTube Data API, OpenAI). Entries are stored
+together with the time they were written and expire after a configurable TTL.
+The cache is persisted to disk with pickle so it survives restarts.
+
+Functions:
+    load_pickle(path, default): Loads a pickle file, falling back to a default.
+    atomic_dump(obj, path): Writes a pickle file without ever leaving it truncated.
+
+Classes:
+    PersistentCache: A thread-safe, pickle-backed cache with per-entry expiry.
+"""
+import os
+import time
+import pickle
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def load_pickle(path, default):
+    """
+    Loads an object from a pickle file.
+
+    Args:
+        path (str): Path to the pickle file.
+        default: The value returned when the file is missing or unreadable.
+
+    Returns:
+        The unpickled object, or the default.
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'rb') as pickle_file:
+            return pickle.load(pickle_file)
+    except (OSError, pickle.PickleError, EOFError) as e:
+        logger.error("Could not load %s: %s", path, e)
+        return default
+
+def atomic_dump(obj, path):
+    """
+    Pickles an object to a file, replacing it atomically.
+
+    The object is written to a temporary file first so a crash never leaves a
+    truncated file behind. Errors are logged, not raised.
+
+    Args:
+        obj: Any picklable object.
+        path (str): Path to the pickle file.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as pickle_file:
+            pickle.dump(obj, pickle_file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error("Could not save %s: %s", path, e)
+
+class PersistentCache:
+    """
+    A thread-safe key-value cache persisted to a pickle file.
+
+    Each entry is stored as a (value, timestamp) pair. Entries older than the
+    configured TTL are treated as missing and are dropped on access. Every write
+    is flushed to disk so the cache can be reused after the bot restarts.
+
+    Args:
+        path (str): Path to the pickle file backing the cache.
+        ttl (float): Time to live of each entry, in seconds.
+    """
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = load_pickle(self.path, {})
+
+    def _save(self):
+        atomic_dump(self._entries, self.path)
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for a key, or a default if it is missing or expired.
+
+        Args:
+            key: The cache key.
+            default: The value returned when the key is missing or expired.
+
+        Returns:
+            The cached value, or the default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self._save()
+                return default
+            return value
+
+    def set(self, key, value):
+        """
+        Stores a value in the cache and persists the cache to disk.
+
+        Args:
+            key: The cache key.
+            value: Any picklable value.
+        """
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._save()
@@ -1,7 +1,12 @@
 """
 Module to handle foreign exchange rate commands in the Telegram bot.
+
+The latest rates are kept in a local rate table, refreshed in the background every
+PP_FX_REFRESH_INTERVAL seconds, so conversions (including inline queries) are
+computed locally instead of calling the API on every request.
 """
 import os
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import CallbackContext
@@ -15,14 +20,58 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 PP_FXAPI_KEY = os.getenv('PP_FXAPI_KEY')
+PP_FX_REFRESH_INTERVAL = int(os.getenv('PP_FX_REFRESH_INTERVAL', '3600'))
 
 # Initialize the Free Currency API client
 client = freecurrencyapi.Client(PP_FXAPI_KEY)
 
+# Latest rates relative to the API's base currency
+rate_table = {'data': {}}
+
+def refresh_rate_table():
+    """
+    Fetches the latest rates from freecurrencyapi.com into the local rate table.
+
+    Returns:
+        bool: True if the table was refreshed.
+    """
+    try:
+        logger.info("Fetching latest exchange rates")
+        latest_rates = client.latest()
+        # Replace the whole table at once so readers never see a partial update
+        rate_table['data'] = latest_rates['data']
+        return True
+    except Exception as e:
+        logger.error("Exception in refresh_rate_table: %s", e)
+        return False
+
+def lookup_exchange_rate(base_currency, target_currency):
+    """
+    Computes the exchange rate between two currencies from the local rate table.
+
+    This never calls the API, so it is safe to use on latency sensitive paths.
+
+    Args:
+        base_currency (str): The base currency code.
+        target_currency (str): The target currency code.
+
+    Returns:
+        float: The exchange rate, or None if a currency is not in the table.
+    """
+    rates = rate_table['data']
+    if base_currency not in rates or target_currency not in rates:
+        return None
+
+    # Convert the base currency to the target currency
+    return rates[target_currency] / rates[base_currency]
+
 def fetch_exchange_rate(base_currency, target_currency):
     """
     Fetches the exchange rate between two currencies using freecurrencyapi.com.
 
+    The local rate table is kept fresh by the background refresh; it is only fetched
+    here if it was never loaded, e.g. right after startup.
+
     Args:
         base_currency (str): The base currency code.
         target_currency (str): The target currency code.
@@ -30,24 +79,13 @@ def fetch_exchange_rate(base_currency, target_currency):
     Returns:
         float: The exchange rate, or None if an error occurs.
     """
-    try:
-        logger.info("Fetching latest exchange rates for %s to %s", base_currency, target_currency)
-        latest_rates = client.latest()
-
-        if base_currency not in latest_rates['data'] or \
-                target_currency not in latest_rates['data']:
-            logger.error("Currency not found in latest rates data.")
-            return None
+    if not rate_table['data']:
+        refresh_rate_table()
 
-        base_rate = latest_rates['data'].get(base_currency, 1)
-        target_rate = latest_rates['data'][target_currency]
-
-        # Convert the base currency to the target currency
-        exchange_rate = target_rate / base_rate
-        return exchange_rate
-    except Exception as e:
-        logger.error("Exception in fetch_exchange_rate: %s", e)
-        return None
+    exchange_rate = lookup_exchange_rate(base_currency, target_currency)
+    if exchange_rate is None:
+        logger.error("Currency not found in latest rates data.")
+    return exchange_rate
 
 async def fx_command(update: Update, context: CallbackContext):
     """
@@ -64,7 +102,10 @@ async def fx_command(update: Update, context: CallbackContext):
 
     base_currency, target_currency = args
     logger.info("Received /fx command for %s to %s", base_currency, target_currency)
-    exchange_rate = fetch_exchange_rate(base_currency.upper(), target_currency.upper())
+    loop = asyncio.get_running_loop()
+    exchange_rate = await loop.run_in_executor(
+        None, fetch_exchange_rate, base_currency.upper(), target_currency.upper()
+    )
 
     if exchange_rate is not None:
         response_message = (
@@ -0,0 +1,110 @@
+"""
+Module to handle inline queries in the Telegram bot.
+
+Inline queries (`@bot 100 usd mxn`, `@bot song title`) are answered from local
+data only: the fx rate table and the playlist index. Nothing on this path calls
+an upstream API, so answers come back as fast as Telegram can deliver them, and
+Telegram is allowed to cache each result set for `cache_time` seconds.
+"""
+import os
+import re
+import logging
+from uuid import uuid4
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import CallbackContext
+from dotenv import load_dotenv
+from fx_handlers import lookup_exchange_rate
+from playlist_index import playlist_index
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PP_INLINE_FX_CACHE_TIME = int(os.getenv('PP_INLINE_FX_CACHE_TIME', '60'))
+PP_INLINE_SONG_CACHE_TIME = int(os.getenv('PP_INLINE_SONG_CACHE_TIME', '300'))
+
+# "100 usd mxn", "usd mxn", "1.5 eur to usd", "1,500.50 usd mxn"
+# A comma is only accepted as a thousands separator, "1,5" is not an amount
+FX_QUERY_PATTERN = re.compile(
+    r'^(?:(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s*)?'
+    r'([a-zA-Z]{3})\s+(?:to\s+)?([a-zA-Z]{3})$'
+)
+
+def fx_results(query):
+    """
+    Builds the inline result of a currency conversion query.
+
+    Args:
+        query (str): The inline query text.
+
+    Returns:
+        list or None: The inline results, or None if the query is not a conversion
+        between currencies of the rate table.
+    """
+    match = FX_QUERY_PATTERN.match(query)
+    if not match:
+        return None
+
+    amount_text, base_currency, target_currency = match.groups()
+    amount = float(amount_text.replace(',', '')) if amount_text else 1.0
+    base_currency, target_currency = base_currency.upper(), target_currency.upper()
+
+    exchange_rate = lookup_exchange_rate(base_currency, target_currency)
+    if exchange_rate is None:
+        # Not known currencies, e.g. a song title like "bad bun"
+        return None
+
+    text = f"{amount:,.2f} {base_currency} = {amount * exchange_rate:,.2f} {target_currency}"
+    return [
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=text,
+            description=f"1 {base_currency} = {exchange_rate:.4f} {target_currency}",
+            input_message_content=InputTextMessageContent(text)
+        )
+    ]
+
+def song_results(query):
+    """
+    Builds the inline results of a song search from the playlist index.
+
+    Args:
+        query (str): The inline query text.
+
+    Returns:
+        list: The inline results, at most one per matching song.
+    """
+    results = []
+    for title, video_id in playlist_index.search(query):
+        song_url = f"https://www.youtube.com/watch?v={video_id}"
+        results.append(
+            InlineQueryResultArticle(
+                id=video_id,
+                title=title,
+                description=song_url,
+                input_message_content=InputTextMessageContent(
+                    f"🎶 {title}\n🔗 Tap to listen: {song_url}"
+                )
+            )
+        )
+    return results
+
+async def inline_query(update: Update, context: CallbackContext):
+    """
+    Answers an inline query with a currency conversion or matching songs.
+
+    Args:
+        update (Update): An object representing an incoming update.
+        context (CallbackContext): The context passed by the Telegram bot framework.
+    """
+    query = update.inline_query.query.strip()
+
+    results = fx_results(query)
+    cache_time = PP_INLINE_FX_CACHE_TIME
+    if results is None:
+        results = song_results(query)
+        cache_time = PP_INLINE_SONG_CACHE_TIME
+
+    await update.inline_query.answer(results, cache_time=cache_time)
+    logger.debug("Answered inline query with %d results.", len(results))
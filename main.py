@@ -7,24 +7,38 @@ and enables access to news information using the News API.
 """
 import os
 import re
+import asyncio
 import logging
 import random
 import time
 import pickle
 from dotenv import load_dotenv
 from telegram import Update
+from telegram.error import NetworkError
 from telegram.ext import (
     ApplicationBuilder,
     MessageHandler,
     filters,
     CommandHandler,
+    InlineQueryHandler,
     CallbackContext
 )
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from googleapiclient.errors import HttpError
 from news_handler import fetch_bing_news, summarize_with_gpt4
-from fx_handlers import fx_command
+from fx_handlers import fx_command, refresh_rate_table, PP_FX_REFRESH_INTERVAL
+from artist_handlers import get_artist
+from youtube_quota import ledger, PRIORITY_RESERVED, QUOTA_EXHAUSTED_TEXT
+from backlog_drain import drain_backlog
+from playlist_index import playlist_index
+from inline_handlers import inline_query
+from news_subscriptions import (
+    subscribe_command,
+    unsubscribe_command,
+    subscriptions_command,
+    run_digest_scheduler
+)
 from bot_utils import send_reply
 import openai
 
@@ -41,7 +55,10 @@ PP_WELCOME_TEXT = os.getenv('PP_WELCOME_TEXT')
 PP_NEWSAPI_KEY = os.getenv('PP_NEWSAPI_KEY')
 PP_NEWSAPI_PAGESIZE = int(os.getenv('PP_NEWSAPI_PAGESIZE', '50'))
 PP_YT_PLAYLIST_ID = os.getenv('PP_YT_PLAYLIST_ID')
+# Slow handlers (GPT, YouTube) must not hold up inline queries and other updates
+PP_CONCURRENT_UPDATES = int(os.getenv('PP_CONCURRENT_UPDATES', '16'))
 PP_YT_AWAITING_LINK = {}
+PP_PLAYLIST_INDEX_REFRESH_INTERVAL = int(os.getenv('PP_PLAYLIST_INDEX_REFRESH_INTERVAL', '21600'))
 
 # OpenAI API configuration
 openai.api_key = PP_OPENAI_TOKEN
@@ -73,7 +90,7 @@ if PP_ENABLE_FILE_LOGGING:
     )
     logging.getLogger().addHandler(file_handler)
 
-    logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 def setup_openai_response(prompt_template, message_text):
     """
@@ -126,6 +143,10 @@ def add_song_to_playlist(song_url, playlist_id):
     if not video_id:
         return "Invalid YouTube URL."
 
+    # Inserts are user-facing, so they are allowed to use the quota reserve
+    if not ledger.spend('playlistItems.insert', priority=PRIORITY_RESERVED):
+        return QUOTA_EXHAUSTED_TEXT
+
     try:
         request = youtube.playlistItems().insert(
             part="snippet",
@@ -141,9 +162,12 @@ def add_song_to_playlist(song_url, playlist_id):
         )
         response = request.execute()
         logger.info("Added video with ID %s to playlist %s", video_id, playlist_id)
+        playlist_index.add(response['snippet']['title'], video_id)
         return f"Song added to playlist: {response['snippet']['title']}"
     except HttpError as e:
         logger.error("Error adding song to playlist: %s", e)
+        if ledger.record_http_error(e):
+            return QUOTA_EXHAUSTED_TEXT
         return "Failed to add song to playlist."
 
 async def add_song(update: Update, context: CallbackContext):
@@ -185,14 +209,17 @@ async def receive_youtube_link(update: Update, context: CallbackContext):
     """
     user_id = update.message.from_user.id
 
-    if PP_YT_AWAITING_LINK.get(user_id):
+    # Clear the flag before awaiting, so a concurrent message is not inserted too
+    if PP_YT_AWAITING_LINK.pop(user_id, False):
         youtube_link = update.message.text
         logger.info("Received YouTube link %s", youtube_link)
 
-        result = add_song_to_playlist(youtube_link, PP_YT_PLAYLIST_ID)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, add_song_to_playlist, youtube_link, PP_YT_PLAYLIST_ID
+        )
         await send_reply(update, context, result)
 
-        PP_YT_AWAITING_LINK[user_id] = False  # Reset the flag
         logger.info("Processed YouTube link: %s", youtube_link)
     else:
         # Ignore other messages
@@ -202,11 +229,12 @@ async def get_song(update: Update, context: CallbackContext):
     """
     Asynchronously selects a random song from a YouTube playlist and sends its URL to the user.
 
-    This function authenticates with YouTube, fetches the details of a specified playlist,
-    and randomly selects a song from this playlist. It then sends a message to the user with 
-    the title of the song and a link to it on YouTube. The function handles potential errors 
-    in fetching playlist details or during random song selection and communicates the outcome 
-    to the user.
+    When the local playlist index is loaded, the song is picked from it without spending
+    any YouTube quota. Otherwise this function authenticates with YouTube, fetches the details
+    of a specified playlist, and randomly selects a song from this playlist. It then sends a
+    message to the user with the title of the song and a link to it on YouTube. The function
+    handles potential errors in fetching playlist details or during random song selection and
+    communicates the outcome to the user.
 
     Args:
         update (Update): An object representing an incoming update.
@@ -215,16 +243,35 @@ async def get_song(update: Update, context: CallbackContext):
     Returns:
         None: This function sends messages to the user and does not return any value.
     """
+    indexed_song = playlist_index.random_entry()
+    if indexed_song:
+        title, video_id = indexed_song
+        song_url = f"https://www.youtube.com/watch?v={video_id}"
+        message = f"🎶 Here's a tune I picked just for you!: {title}\n" + \
+                  f"🔗 Tap to listen: {song_url}"
+
+        await send_reply(update, context, message)
+        logger.info("Recommended indexed song: %s URL: %s", title, song_url)
+        return
+
+    # The YouTube client is blocking, run its calls in the executor
+    loop = asyncio.get_running_loop()
+
     # Authenticate and get YouTube service
-    youtube = get_authenticated_service()
+    youtube = await loop.run_in_executor(None, get_authenticated_service)
     playlist_id = PP_YT_PLAYLIST_ID
 
     try:
+        if not ledger.spend('playlists.list'):
+            await send_reply(update, context, QUOTA_EXHAUSTED_TEXT)
+            return
+
         # Get total number of songs in the playlist
-        playlist_details = youtube.playlists().list(
+        request = youtube.playlists().list(
             part="contentDetails",
             id=playlist_id
-        ).execute()
+        )
+        playlist_details = await loop.run_in_executor(None, request.execute)
 
         total_songs = playlist_details["items"][0]["contentDetails"]["itemCount"]
 
@@ -236,32 +283,38 @@ async def get_song(update: Update, context: CallbackContext):
         items_per_page = 50  # Adjust as needed
         current_page = 0
 
-        if random_index > items_per_page:
-            target_page = random_index // items_per_page
+        target_page = random_index // items_per_page if random_index > items_per_page else 0
+
+        # One list call per page to skip plus one for the page holding the song
+        if not ledger.spend('playlistItems.list', calls=target_page + 1):
+            await send_reply(update, context, QUOTA_EXHAUSTED_TEXT)
+            return
 
-            while current_page < target_page:
-                response = youtube.playlistItems().list(
-                    part="snippet",
-                    playlistId=playlist_id,
-                    maxResults=items_per_page,
-                    pageToken=page_token
-                ).execute()
+        while current_page < target_page:
+            request = youtube.playlistItems().list(
+                part="snippet",
+                playlistId=playlist_id,
+                maxResults=items_per_page,
+                pageToken=page_token
+            )
+            response = await loop.run_in_executor(None, request.execute)
 
-                page_token = response.get("nextPageToken")
-                current_page += 1
+            page_token = response.get("nextPageToken")
+            current_page += 1
 
-                # Break the loop if there's no more pages but we haven't reached the target page
-                if not page_token:
-                    break
+            # Break the loop if there's no more pages but we haven't reached the target page
+            if not page_token:
+                break
 
         # Now page_token is set to the page where the random song is located
         # Retrieve the specific song
-        response = youtube.playlistItems().list(
+        request = youtube.playlistItems().list(
             part="snippet",
             playlistId=playlist_id,
             maxResults=items_per_page,
             pageToken=page_token  # Use the calculated page token
-        ).execute()
+        )
+        response = await loop.run_in_executor(None, request.execute)
 
         # Calculate the index of the song in the current page
         song_index_in_page = random_index % items_per_page - 1
@@ -282,7 +335,10 @@ async def get_song(update: Update, context: CallbackContext):
     except HttpError as e:
         logger.error("Error fetching songs from playlist: %s", e)
         # Use send_reply for error messages too
-        await send_reply(update, context, "Failed to fetch song from playlist.")
+        if ledger.record_http_error(e):
+            await send_reply(update, context, QUOTA_EXHAUSTED_TEXT)
+        else:
+            await send_reply(update, context, "Failed to fetch song from playlist.")
 
     except Exception as e:
         logger.error("An unexpected error occurred: %s", e, exc_info=True)
@@ -380,25 +436,105 @@ async def detect_fallacy(update: Update, context):
     replied_message = update.message.reply_to_message
     if replied_message:
         logger.info("Analyzing for fallacies: %s", replied_message.text)
-        answer = setup_openai_response(PP_FALLACY_PROMPT, replied_message.text)
+        loop = asyncio.get_running_loop()
+        answer = await loop.run_in_executor(
+            None, setup_openai_response, PP_FALLACY_PROMPT, replied_message.text
+        )
         await send_reply(update, context, answer)
 
 async def news_command(update: Update, context: CallbackContext):
     user_input = ' '.join(context.args) or 'latest news'
 
-    articles = fetch_bing_news(user_input)
+    loop = asyncio.get_running_loop()
+    articles = await loop.run_in_executor(None, fetch_bing_news, user_input)
     if articles:
         await summarize_with_gpt4(articles, lambda text: send_reply(update, context, text))
     else:
         await send_reply(update, context, "No relevant news articles found.")
 
+async def quota_command(update: Update, context: CallbackContext):
+    """
+    Reports how much of the YouTube Data API daily quota is left.
+
+    Args:
+        update (Update): An object representing an incoming update.
+        context (CallbackContext): An object providing context about the update.
+    """
+    remaining = ledger.remaining()
+    exhaustion = ledger.predict_exhaustion()
+    message = f"YouTube quota left: {remaining}/{ledger.daily_quota} units."
+    if exhaustion is not None and exhaustion < ledger.next_reset():
+        message += f"\nAt the current rate it runs out at {exhaustion:%H:%M} PT."
+    await send_reply(update, context, message)
+
+async def refresh_periodically(refresh, interval, name):
+    """
+    Runs a blocking refresh function in the executor every `interval` seconds.
+
+    Args:
+        refresh (callable): The blocking function refreshing a local cache.
+        interval (int): Seconds between two refreshes.
+        name (str): A name used in log messages.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, refresh)
+        except Exception as e:
+            logger.error("Error refreshing %s: %s", name, e)
+        await asyncio.sleep(interval)
+
+def refresh_playlist_index():
+    """
+    Rebuilds the playlist index unless the YouTube quota budget is low.
+    """
+    if ledger.should_defer_background():
+        logger.info("Skipping playlist index refresh, YouTube quota is low.")
+        return
+    playlist_index.refresh(get_authenticated_service(), PP_YT_PLAYLIST_ID)
+
+async def post_init(application):
+    """
+    Starts the background refresh of local caches and the news digest scheduler, then
+    drains the update backlog.
+
+    Args:
+        application (Application): The initialized Telegram application.
+    """
+    application.bot_data['background_tasks'] = [
+        asyncio.create_task(
+            refresh_periodically(refresh_rate_table, PP_FX_REFRESH_INTERVAL, 'fx rates')
+        ),
+        asyncio.create_task(
+            refresh_periodically(
+                refresh_playlist_index, PP_PLAYLIST_INDEX_REFRESH_INTERVAL, 'playlist index'
+            )
+        ),
+        asyncio.create_task(run_digest_scheduler(application.bot)),
+    ]
+    await drain_backlog(application)
+
+async def post_shutdown(application):
+    """
+    Cancels the background tasks started by post_init.
+
+    Args:
+        application (Application): The Telegram application being shut down.
+    """
+    for task in application.bot_data.pop('background_tasks', []):
+        task.cancel()
+
+async def artist_command(update: Update, context: CallbackContext):
+    await get_artist(update, context, get_authenticated_service)
+
 def main():
     """
     Main function for running the Telegram bot application.
 
     This function sets up the Telegram bot application, registers command and message handlers, 
     and continuously runs the bot to interact with users. It handles network errors gracefully 
-    by retrying after a brief delay and exits the loop for unexpected errors.
+    by retrying after a brief delay and exits the loop for unexpected errors. Every (re)start
+    of the polling loop first drains the updates that piled up while the bot was down.
 
     The following handlers are registered:
     - 'start_handler' for handling the "/start" command.
@@ -407,6 +543,12 @@ def main():
     - 'get_song_handler' for handling the "/getsong" command and recommending songs.
     - 'add_song_handler' for handling the "/addsong" command and adding songs to a playlist.
     - 'youtube_link_handler' for handling text messages that are not commands.
+    - 'fx_handler' for handling the "/fx" command and currency conversions.
+    - 'artist_handler' for handling the "/artist" command and artist lookups.
+    - 'quota_handler' for handling the "/quota" command and reporting YouTube quota.
+    - 'inline_handler' for answering inline queries from the fx rate table and playlist index.
+    - 'subscribe_handler', 'unsubscribe_handler' and 'subscriptions_handler' for managing
+      scheduled news digests.
 
     Args:
         None: This function takes no arguments.
@@ -415,7 +557,14 @@ def main():
         None: This function continuously runs the Telegram bot application and does not
         return a value.
     """
-    application = ApplicationBuilder().token(PP_TELEGRAM_TOKEN).build()
+    application = (
+        ApplicationBuilder()
+        .token(PP_TELEGRAM_TOKEN)
+        .concurrent_updates(PP_CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Handlers
     start_handler = CommandHandler('start', start)
@@ -428,6 +577,12 @@ def main():
     add_song_handler = CommandHandler('addsong', add_song)
     youtube_link_handler = MessageHandler(filters.TEXT & ~filters.COMMAND, receive_youtube_link)
     fx_handler = CommandHandler('fx', fx_command)
+    artist_handler = CommandHandler('artist', artist_command)
+    quota_handler = CommandHandler('quota', quota_command)
+    inline_handler = InlineQueryHandler(inline_query)
+    subscribe_handler = CommandHandler('subscribe', subscribe_command)
+    unsubscribe_handler = CommandHandler('unsubscribe', unsubscribe_command)
+    subscriptions_handler = CommandHandler('subscriptions', subscriptions_command)
 
     # Register handlers with the application
     application.add_handler(start_handler)
@@ -437,16 +592,25 @@ def main():
     application.add_handler(add_song_handler)
     application.add_handler(youtube_link_handler)
     application.add_handler(fx_handler)
+    application.add_handler(artist_handler)
+    application.add_handler(quota_handler)
+    application.add_handler(inline_handler)
+    application.add_handler(subscribe_handler)
+    application.add_handler(unsubscribe_handler)
+    application.add_handler(subscriptions_handler)
 
     while True:
         try:
-            application.run_polling()
-        except telegram.error.NetworkError as e:
+            # Keep the event loop open so the loop can be restarted after a network error
+            application.run_polling(close_loop=False)
+        except NetworkError as e:
             logger.error("Network error encountered: %s", e)
             time.sleep(5)  # Wait for 5 seconds before retrying
+            continue
         except Exception as e:
             logger.error("Unexpected error: %s", e)
-            break  # Exit the loop for unexpected errors
+        # run_polling returns normally on SIGINT/SIGTERM, exit instead of polling again
+        break
 
 if __name__ == '__main__':
     main()
@@ -5,7 +5,9 @@ It uses environment variables for configuration and provides async functions
 for news fetching and summarization.
 """
 import os
+import asyncio
 import logging
+import functools
 import requests
 import openai
 from dotenv import load_dotenv
@@ -17,16 +19,18 @@ PP_OPENAI_TOKEN = os.getenv('PP_OPENAI_TOKEN')
 PP_SUMMARIZATION_PROMPT = os.getenv('PP_SUMMARIZATION_PROMPT')
 PP_OPENAI_ENGINE = os.getenv('PP_OPENAI_ENGINE', 'gpt-4')
 PP_BING_NEWS_ENDPOINT = os.getenv('PP_BING_NEWS_ENDPOINT')
+PP_BING_NEWS_MARKET = os.getenv('PP_BING_NEWS_MARKET', 'es-MX')
 
 openai.api_key = PP_OPENAI_TOKEN
 logger = logging.getLogger(__name__)
 
-def fetch_bing_news(query):
+def fetch_bing_news(query, market=PP_BING_NEWS_MARKET):
     """
     Fetches news articles from the Bing News API based on the given query.
     
     Args:
         query (str): The search query for fetching news articles.
+        market (str): The Bing market code, e.g. 'es-MX'.
 
     Returns:
         list: A list of news articles, each containing details like name and description.
@@ -37,7 +41,7 @@ def fetch_bing_news(query):
     params = {
         'q': query,
         'count': 5,
-        'mkt': 'es-MX'
+        'mkt': market
     }
 
     try:
@@ -59,16 +63,18 @@ def fetch_bing_news(query):
         logger.error("Error fetching news: %s", e)
         return []
 
-async def summarize_with_gpt4(articles, send_reply_func):
+async def build_news_summary(articles):
     """
-    Asynchronously summarizes a list of articles using OpenAI's GPT-4 model.
+    Asynchronously builds a summary of a list of articles using OpenAI's GPT-4 model.
 
     Args:
         articles (list): A list of news articles to summarize.
-        send_reply_func (async function): An async callback function to send the summary.
+
+    Returns:
+        str: The summary followed by inline links to the sources.
 
     This function combines article titles and descriptions, generates a summary using GPT-4,
-    and sends the summary through the provided callback function.
+    and appends the source links. Errors from the API are propagated to the caller.
     """
     # Combine the titles and descriptions of all articles into one text
     combined_text = ' '.join(
@@ -78,27 +84,45 @@ async def summarize_with_gpt4(articles, send_reply_func):
     # Construct the prompt for summarization
     prompt = PP_SUMMARIZATION_PROMPT + combined_text
 
-    try:
-        response = openai.Completion.create(
+    # Run the blocking API call in the executor so other updates keep being served
+    response = await asyncio.get_running_loop().run_in_executor(
+        None,
+        functools.partial(
+            openai.Completion.create,
             engine=PP_OPENAI_ENGINE,
             prompt=prompt,
             max_tokens=350,
             temperature=0.5
         )
-        # Extract the summary text
-        summary = (
-            response.choices[0].text.strip()
-            if response.choices else "No clear summary available."
-        )
+    )
+    # Extract the summary text
+    summary = (
+        response.choices[0].text.strip()
+        if response.choices else "No clear summary available."
+    )
 
-        # Log the summary generation
-        logger.info("Generated summary using %s.", PP_OPENAI_ENGINE)
+    # Log the summary generation
+    logger.info("Generated summary using %s.", PP_OPENAI_ENGINE)
 
-        # Format the message with summary and inline links
-        source_links = ', '.join(
-            [f"[{idx + 1}]({article['url']})" for idx, article in enumerate(articles)]
-        )
-        message_with_links = summary + "\n\nSources: " + source_links
+    # Format the message with summary and inline links
+    source_links = ', '.join(
+        [f"[{idx + 1}]({article['url']})" for idx, article in enumerate(articles)]
+    )
+    return summary + "\n\nSources: " + source_links
+
+async def summarize_with_gpt4(articles, send_reply_func):
+    """
+    Asynchronously summarizes a list of articles using OpenAI's GPT-4 model.
+
+    Args:
+        articles (list): A list of news articles to summarize.
+        send_reply_func (async function): An async callback function to send the summary.
+
+    This function generates the summary with build_news_summary and sends it through
+    the provided callback function.
+    """
+    try:
+        message_with_links = await build_news_summary(articles)
 
         # Send the formatted message using the provided callback function
         await send_reply_func(message_with_links)
@@ -0,0 +1,370 @@
+"""
+news_subscriptions.py
+
+This module implements scheduled news digests. Chats subscribe to a topic at a
+time of day with /subscribe, and subscriptions are stored locally with pickle.
+Every minute, the scheduler groups the subscriptions due at that time by topic
+and market, computes each digest once (one Bing News fetch and one GPT call) and
+fans it out to all subscribed chats at a bounded send rate.
+
+Functions:
+    subscribe_command(update, context): Handles the /subscribe command.
+    unsubscribe_command(update, context): Handles the /unsubscribe command.
+    subscriptions_command(update, context): Handles the /subscriptions command.
+    run_digest_scheduler(bot): Runs the digest scheduler until cancelled.
+"""
+import os
+import re
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+import pytz
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter, TelegramError
+from telegram.ext import CallbackContext
+from telegram.helpers import escape_markdown
+from dotenv import load_dotenv
+from news_handler import fetch_bing_news, build_news_summary, PP_BING_NEWS_MARKET
+from bot_utils import send_reply, send_to_chat, PP_REPLY_TO_PRIVATE
+from cache_utils import load_pickle, atomic_dump
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PP_SUBSCRIPTIONS_FILE = os.getenv('PP_SUBSCRIPTIONS_FILE', 'subscriptions.pickle')
+PP_DIGEST_TIMEZONE = pytz.timezone(os.getenv('PP_DIGEST_TIMEZONE', 'America/Mexico_City'))
+# Telegram allows about 30 messages per second across all chats, this interval
+# is shared by every digest sent at the same time
+PP_DIGEST_SEND_INTERVAL = float(os.getenv('PP_DIGEST_SEND_INTERVAL', '0.05'))
+
+TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+# Longest scheduler delay for which missed slots are still delivered
+MAX_CATCH_UP = timedelta(minutes=10)
+# Sends to one chat, including retries after RetryAfter, ChatMigrated or a parse error
+MAX_SEND_ATTEMPTS = 3
+
+class SubscriptionStore:
+    """
+    Persistent storage of news digest subscriptions.
+
+    Subscriptions are keyed by chat ID and normalized topic, so a chat subscribing
+    again to the same topic only changes its delivery time.
+
+    Args:
+        path (str): Path to the pickle file backing the store.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscriptions = load_pickle(self.path, {})
+
+    def _save(self):
+        atomic_dump(self._subscriptions, self.path)
+
+    @staticmethod
+    def normalize_topic(topic):
+        """
+        Normalizes a topic so that different spellings share a digest.
+
+        Args:
+            topic (str): The topic as typed by the user.
+
+        Returns:
+            str: The topic lower-cased with whitespace collapsed.
+        """
+        return ' '.join(topic.lower().split())
+
+    def add(self, chat_id, topic, slot, market):
+        """
+        Adds or updates the subscription of a chat to a topic.
+
+        Args:
+            chat_id (int): The subscribed chat.
+            topic (str): The news topic.
+            slot (str): Delivery time, formatted as HH:MM.
+            market (str): The Bing market code.
+        """
+        with self._lock:
+            self._subscriptions[(chat_id, self.normalize_topic(topic))] = {
+                'slot': slot,
+                'market': market
+            }
+            self._save()
+
+    def remove(self, chat_id, topic=None):
+        """
+        Removes the subscription of a chat to a topic, or all its subscriptions.
+
+        Args:
+            chat_id (int): The subscribed chat.
+            topic (str): The news topic, or None to remove every subscription.
+
+        Returns:
+            int: The number of removed subscriptions.
+        """
+        with self._lock:
+            keys = [
+                key for key in self._subscriptions
+                if key[0] == chat_id and (topic is None or key[1] == self.normalize_topic(topic))
+            ]
+            for key in keys:
+                del self._subscriptions[key]
+            if keys:
+                self._save()
+            return len(keys)
+
+    def move_chat(self, old_chat_id, new_chat_id):
+        """
+        Moves the subscriptions of a chat to a new chat ID.
+
+        Used when a group is upgraded to a supergroup, which changes its ID.
+
+        Args:
+            old_chat_id (int): The previous chat ID.
+            new_chat_id (int): The new chat ID.
+        """
+        with self._lock:
+            for key in [key for key in self._subscriptions if key[0] == old_chat_id]:
+                self._subscriptions[(new_chat_id, key[1])] = self._subscriptions.pop(key)
+            self._save()
+
+    def for_chat(self, chat_id):
+        """
+        Lists the subscriptions of a chat.
+
+        Args:
+            chat_id (int): The chat.
+
+        Returns:
+            list: (topic, slot) pairs sorted by delivery time.
+        """
+        with self._lock:
+            return sorted(
+                ((key[1], sub['slot']) for key, sub in self._subscriptions.items()
+                 if key[0] == chat_id),
+                key=lambda item: item[1]
+            )
+
+    def due(self, slot):
+        """
+        Groups the subscriptions due at a delivery time by topic and market.
+
+        Args:
+            slot (str): Delivery time, formatted as HH:MM.
+
+        Returns:
+            dict: (topic, market) to the list of subscribed chat IDs.
+        """
+        groups = {}
+        with self._lock:
+            for (chat_id, topic), sub in self._subscriptions.items():
+                if sub['slot'] == slot:
+                    groups.setdefault((topic, sub['market']), []).append(chat_id)
+        return groups
+
+class SendRateLimiter:
+    """
+    Spaces out message sends across all concurrent fan-outs.
+
+    The lock is created on first use so that it belongs to the running event loop.
+
+    Args:
+        interval (float): Minimum number of seconds between two sends.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = None
+        self._next_send = 0.0
+
+    async def wait(self):
+        """
+        Waits until the next message may be sent and reserves that send.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_send = loop.time() + self.interval
+
+    def pause(self, seconds):
+        """
+        Holds back every send for the given time, e.g. when Telegram asks to retry later.
+
+        Args:
+            seconds (float): Seconds to wait before the next send.
+        """
+        self._next_send = max(self._next_send, asyncio.get_running_loop().time() + seconds)
+
+subscription_store = SubscriptionStore(PP_SUBSCRIPTIONS_FILE)
+send_limiter = SendRateLimiter(PP_DIGEST_SEND_INTERVAL)
+_digest_tasks = set()
+
+async def subscribe_command(update: Update, context: CallbackContext):
+    """
+    Handles the /subscribe command in the Telegram bot.
+
+    Usage: /subscribe <topic> <HH:MM>. The digest is delivered daily at the given
+    time in PP_DIGEST_TIMEZONE. Private chats cannot subscribe unless
+    PP_REPLY_TO_PRIVATE is set, since the bot does not message them.
+
+    Args:
+        update (Update): An object representing an incoming update.
+        context (CallbackContext): The context passed by the Telegram bot framework.
+    """
+    if update.effective_chat.type == 'private' and not PP_REPLY_TO_PRIVATE:
+        logger.info("Ignoring /subscribe in private chat as PP_REPLY_TO_PRIVATE is False.")
+        return
+
+    args = context.args
+    match = TIME_PATTERN.match(args[-1]) if len(args) >= 2 else None
+    if not match:
+        await send_reply(update, context, "Usage: /subscribe <topic> <HH:MM>")
+        return
+
+    topic = ' '.join(args[:-1])
+    slot = f"{int(match.group(1)):02d}:{match.group(2)}"
+    subscription_store.add(update.effective_chat.id, topic, slot, PP_BING_NEWS_MARKET)
+    logger.info("Chat %s subscribed to %s at %s", update.effective_chat.id, topic, slot)
+    await send_reply(
+        update, context,
+        f"Subscribed to {escape_markdown(topic)}, daily at {slot}."
+    )
+
+async def unsubscribe_command(update: Update, context: CallbackContext):
+    """
+    Handles the /unsubscribe command in the Telegram bot.
+
+    Usage: /unsubscribe [topic]. Without a topic, every subscription of the chat
+    is removed.
+
+    Args:
+        update (Update): An object representing an incoming update.
+        context (CallbackContext): The context passed by the Telegram bot framework.
+    """
+    topic = ' '.join(context.args) or None
+    removed = subscription_store.remove(update.effective_chat.id, topic)
+    await send_reply(update, context, f"Removed {removed} subscription(s).")
+
+async def subscriptions_command(update: Update, context: CallbackContext):
+    """
+    Handles the /subscriptions command in the Telegram bot, listing the chat's digests.
+
+    Args:
+        update (Update): An object representing an incoming update.
+        context (CallbackContext): The context passed by the Telegram bot framework.
+    """
+    subscriptions = subscription_store.for_chat(update.effective_chat.id)
+    if not subscriptions:
+        await send_reply(update, context, "This chat has no news subscriptions.")
+        return
+    lines = [f"{slot} - {escape_markdown(topic)}" for topic, slot in subscriptions]
+    await send_reply(update, context, '\n'.join(lines))
+
+async def fan_out(bot, chat_ids, text):
+    """
+    Sends the same message to several chats, one at a time.
+
+    Sends go through the shared send_limiter, so concurrent digests together stay
+    under Telegram's global rate limit. Chats that blocked or removed the bot are
+    unsubscribed, and chats upgraded to a supergroup have their subscriptions moved
+    to the new ID. When Telegram asks to slow down, every fan-out waits the requested
+    time before the chat is retried. If Telegram cannot parse the Markdown of the
+    message, it is sent as plain text to this and all remaining chats.
+
+    Args:
+        bot (telegram.Bot): The bot used to send the messages.
+        chat_ids (list): The destination chats.
+        text (str): The message to send.
+    """
+    parse_mode = ParseMode.MARKDOWN
+    for chat_id in chat_ids:
+        for _ in range(MAX_SEND_ATTEMPTS):
+            await send_limiter.wait()
+            try:
+                await send_to_chat(bot, chat_id, text, parse_mode)
+                break
+            except RetryAfter as e:
+                send_limiter.pause(e.retry_after)
+            except ChatMigrated as e:
+                logger.info("Chat %s migrated to %s, moving its subscriptions.",
+                            chat_id, e.new_chat_id)
+                subscription_store.move_chat(chat_id, e.new_chat_id)
+                chat_id = e.new_chat_id
+            except Forbidden:
+                logger.warning("Chat %s blocked the bot, removing its subscriptions.", chat_id)
+                subscription_store.remove(chat_id)
+                break
+            except BadRequest as e:
+                if parse_mode is None or "can't parse entities" not in str(e).lower():
+                    logger.error("Error sending digest to chat %s: %s", chat_id, e)
+                    break
+                logger.warning("Digest Markdown is invalid, sending it as plain text: %s", e)
+                parse_mode = None
+            except TelegramError as e:
+                logger.error("Error sending digest to chat %s: %s", chat_id, e)
+                break
+        else:
+            logger.error("Giving up sending digest to chat %s after %d attempts.",
+                         chat_id, MAX_SEND_ATTEMPTS)
+
+async def send_digest(bot, topic, market, chat_ids):
+    """
+    Computes the digest of a topic once and sends it to every subscribed chat.
+
+    Args:
+        bot (telegram.Bot): The bot used to send the digest.
+        topic (str): The news topic.
+        market (str): The Bing market code.
+        chat_ids (list): The subscribed chats.
+    """
+    loop = asyncio.get_running_loop()
+    articles = await loop.run_in_executor(None, fetch_bing_news, topic, market)
+    if not articles:
+        logger.info("No news for digest %s (%s), nothing sent.", topic, market)
+        return
+
+    try:
+        summary = await build_news_summary(articles)
+    except Exception as e:
+        logger.error("Error generating digest %s (%s): %s", topic, market, e)
+        return
+
+    logger.info("Sending digest %s (%s) to %d chats.", topic, market, len(chat_ids))
+    await fan_out(bot, chat_ids, f"🗞 *{escape_markdown(topic)}*\n\n{summary}")
+
+async def run_digest_scheduler(bot):
+    """
+    Starts the digests due every minute until cancelled.
+
+    Slots missed because the loop woke up late (for at most MAX_CATCH_UP) are
+    still delivered, each (topic, market) group exactly once. Digests still being
+    sent are cancelled together with the scheduler.
+
+    Args:
+        bot (telegram.Bot): The bot used to send the digests.
+    """
+    last_slot = datetime.now(PP_DIGEST_TIMEZONE).replace(second=0, microsecond=0)
+    try:
+        while True:
+            now = datetime.now(PP_DIGEST_TIMEZONE)
+            await asyncio.sleep(60 - now.second - now.microsecond / 1_000_000)
+
+            current_slot = datetime.now(PP_DIGEST_TIMEZONE).replace(second=0, microsecond=0)
+            slot = max(last_slot, current_slot - MAX_CATCH_UP) + timedelta(minutes=1)
+            while slot <= current_slot:
+                due = subscription_store.due(f"{slot:%H:%M}")
+                for (topic, market), chat_ids in due.items():
+                    task = asyncio.create_task(send_digest(bot, topic, market, chat_ids))
+                    _digest_tasks.add(task)
+                    task.add_done_callback(_digest_tasks.discard)
+                slot += timedelta(minutes=1)
+            last_slot = max(last_slot, current_slot)
+    finally:
+        for task in list(_digest_tasks):
+            task.cancel()
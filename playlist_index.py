@@ -0,0 +1,183 @@
+"""
+playlist_index.py
+
+This module keeps a local index of the songs in the bot's YouTube playlist, so
+that song lookups (inline queries, /getsong) are answered without calling the
+YouTube Data API. The index is rebuilt in the background, spending quota with
+background priority, and persisted to disk so it is available right after a
+restart.
+
+Classes:
+    PlaylistIndex: A persisted list of (title, video ID) pairs with prefix search.
+"""
+import os
+import random
+import logging
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+from googleapiclient.errors import HttpError
+from youtube_quota import ledger, PRIORITY_BACKGROUND
+from cache_utils import load_pickle, atomic_dump
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PP_PLAYLIST_INDEX_FILE = os.getenv('PP_PLAYLIST_INDEX_FILE', 'playlist_index.pickle')
+
+MAX_RESULTS = 50
+
+class PlaylistIndex:
+    """
+    A local, persisted index of the songs in a YouTube playlist.
+
+    Titles are lower-cased once when the index is built. Searches are memoized per
+    query, and a query is answered by narrowing the results of the query without
+    its last character, so results are effectively precomputed as the user types.
+    Each version of the entries gets its own memoized search, so a search running
+    while the index changes can never leave stale results behind.
+
+    Args:
+        path (str): Path to the pickle file backing the index.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Songs added while a refresh is running, re-applied when it completes
+        self._pending = None
+        self._set_entries(load_pickle(self.path, []))
+
+    @staticmethod
+    def _make_search(entries):
+        @lru_cache(maxsize=1024)
+        def search(query):
+            if not query:
+                return entries
+            # Every match of the query also matches the query minus its last character
+            candidates = search(query[:-1])
+            words = query.split()
+            return tuple(
+                entry for entry in candidates
+                if all(word in entry[2] for word in words)
+            )
+        return search
+
+    def _set_entries(self, entries):
+        # Callers hold the lock, except in __init__
+        self._entries = tuple(entries)
+        self._search = self._make_search(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Finds songs whose title contains every word of the query.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list: (title, video_id) pairs.
+        """
+        query = ' '.join(query.lower().split())
+        return [(title, video_id) for title, video_id, _ in self._search(query)[:limit]]
+
+    def random_entry(self):
+        """
+        Returns a random song from the index.
+
+        Returns:
+            tuple or None: A (title, video_id) pair, or None if the index is empty.
+        """
+        entries = self._entries
+        if not entries:
+            return None
+        title, video_id, _ = random.choice(entries)
+        return title, video_id
+
+    def add(self, title, video_id):
+        """
+        Adds a song to the index, e.g. right after it was inserted in the playlist.
+
+        Args:
+            title (str): The title of the song.
+            video_id (str): The YouTube video ID.
+        """
+        entry = (title, video_id, title.lower())
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(entry)
+            if any(existing[1] == video_id for existing in self._entries):
+                return
+            self._set_entries(self._entries + (entry,))
+            atomic_dump(self._entries, self.path)
+
+    def refresh(self, youtube, playlist_id):
+        """
+        Rebuilds the index from the playlist, page by page.
+
+        Each page spends quota with background priority. If the budget runs low
+        in the middle of the refresh, the refresh is abandoned and the previous
+        index is kept.
+
+        Args:
+            youtube (googleapiclient.discovery.Resource): An authenticated YouTube client.
+            playlist_id (str): The ID of the playlist to index.
+
+        Returns:
+            bool: True if the index was rebuilt.
+        """
+        with self._lock:
+            self._pending = []
+        try:
+            entries = self._fetch_entries(youtube, playlist_id)
+            if entries is None:
+                return False
+            with self._lock:
+                # Songs added after their page was fetched are not in the new entries
+                fetched = {entry[1] for entry in entries}
+                entries.extend(entry for entry in self._pending if entry[1] not in fetched)
+                self._set_entries(entries)
+                atomic_dump(self._entries, self.path)
+        finally:
+            with self._lock:
+                self._pending = None
+
+        logger.info("Playlist index refreshed with %d songs.", len(entries))
+        return True
+
+    def _fetch_entries(self, youtube, playlist_id):
+        entries = []
+        seen = set()
+        page_token = None
+        while True:
+            if not ledger.spend('playlistItems.list', priority=PRIORITY_BACKGROUND):
+                logger.info("Playlist index refresh deferred, YouTube quota is low.")
+                return None
+            try:
+                response = youtube.playlistItems().list(
+                    part="snippet",
+                    playlistId=playlist_id,
+                    maxResults=MAX_RESULTS,
+                    pageToken=page_token
+                ).execute()
+            except HttpError as e:
+                logger.error("Error refreshing playlist index: %s", e)
+                ledger.record_http_error(e)
+                return None
+            for item in response.get("items", []):
+                title = item["snippet"]["title"]
+                video_id = item["snippet"]["resourceId"]["videoId"]
+                # A playlist may hold the same video twice, inline results need unique IDs
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+                entries.append((title, video_id, title.lower()))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return entries
+
+playlist_index = PlaylistIndex(PP_PLAYLIST_INDEX_FILE)
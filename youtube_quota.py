@@ -0,0 +1,246 @@
+"""
+youtube_quota.py
+
+This module keeps track of the YouTube Data API daily quota shared by every
+YouTube call the bot makes. Each API method has a fixed unit cost, the spend of
+the current quota day is persisted to disk, and callers ask the ledger before
+executing a request. Background work is deferred early so that a reserve of
+units is always left for user-facing playlist inserts.
+
+The quota resets at midnight Pacific Time, as documented by Google.
+
+Classes:
+    QuotaLedger: Persistent, thread-safe accounting of the daily quota.
+"""
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+import pytz
+from dotenv import load_dotenv
+from cache_utils import load_pickle, atomic_dump
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PP_YT_DAILY_QUOTA = int(os.getenv('PP_YT_DAILY_QUOTA', '10000'))
+PP_YT_QUOTA_RESERVE = int(os.getenv('PP_YT_QUOTA_RESERVE', '500'))
+PP_YT_QUOTA_BACKGROUND_FLOOR = int(os.getenv('PP_YT_QUOTA_BACKGROUND_FLOOR', '2000'))
+PP_YT_QUOTA_FILE = os.getenv('PP_YT_QUOTA_FILE', 'youtube_quota.pickle')
+
+QUOTA_TIMEZONE = pytz.timezone('America/Los_Angeles')
+QUOTA_EXHAUSTED_TEXT = "The YouTube quota for today is exhausted, please try again later."
+
+# Unit cost of each YouTube Data API method used by the bot
+QUOTA_COSTS = {
+    'search.list': 100,
+    'channels.list': 1,
+    'playlists.list': 1,
+    'playlistItems.list': 1,
+    'playlistItems.insert': 50,
+}
+
+# Spending priorities, from the most to the least important
+PRIORITY_RESERVED = 'reserved'      # User-facing inserts, may use the reserve
+PRIORITY_USER = 'user'              # Other user-facing requests
+PRIORITY_BACKGROUND = 'background'  # Reconciliation, prefetch and other deferrable work
+
+class QuotaLedger:
+    """
+    Persistent accounting of the YouTube Data API daily quota.
+
+    The ledger stores the quota day and the units spent during that day. The burn
+    rate is the spend divided by the time elapsed since the last reset. Whether a
+    request may spend depends on its priority: reserved requests may use the whole
+    quota, user requests must leave the reserve untouched, and background requests
+    are deferred when the remaining budget is low or predicted to run out before
+    the next reset.
+
+    Args:
+        path (str): Path to the pickle file backing the ledger.
+        daily_quota (int): Units available per quota day.
+        reserve (int): Units kept for reserved (user-facing insert) requests.
+        background_floor (int): Units that must remain, on top of the reserve,
+            for background requests to be allowed.
+    """
+    def __init__(self, path, daily_quota, reserve, background_floor):
+        self.path = path
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self.background_floor = background_floor
+        self._lock = threading.Lock()
+        self._state = load_pickle(self.path, None) or self._new_state()
+
+    @staticmethod
+    def _now():
+        return datetime.now(QUOTA_TIMEZONE)
+
+    def _new_state(self):
+        return {'day': self._now().date(), 'spent': 0}
+
+    def _save(self):
+        atomic_dump(self._state, self.path)
+
+    def _roll_over(self):
+        # Start a fresh quota day once midnight Pacific Time has passed
+        if self._state['day'] != self._now().date():
+            logger.info("YouTube quota day rolled over, %d units were spent.",
+                        self._state['spent'])
+            self._state = self._new_state()
+            self._save()
+
+    def _remaining(self):
+        return max(self.daily_quota - self._state['spent'], 0)
+
+    def _day_start(self, days=0):
+        # Localize the date itself, adding a timedelta would keep the offset across DST changes
+        day = self._state['day'] + timedelta(days=days)
+        return QUOTA_TIMEZONE.localize(datetime.combine(day, datetime.min.time()))
+
+    def _predict_exhaustion(self):
+        if self._state['spent'] == 0:
+            return None
+        elapsed = (self._now() - self._day_start()).total_seconds()
+        if elapsed <= 0:
+            return None
+        burn_rate = self._state['spent'] / elapsed
+        return self._now() + timedelta(seconds=self._remaining() / burn_rate)
+
+    def _next_reset(self):
+        return self._day_start(days=1)
+
+    def _allowed(self, cost, priority):
+        remaining = self._remaining()
+        if priority == PRIORITY_RESERVED:
+            return cost <= remaining
+        if priority == PRIORITY_USER:
+            return cost <= remaining - self.reserve
+        # Background work leaves a cushion and yields when the burn rate is too high
+        if cost > remaining - self.reserve - self.background_floor:
+            return False
+        exhaustion = self._predict_exhaustion()
+        return exhaustion is None or exhaustion >= self._next_reset()
+
+    def cost(self, method, calls=1):
+        """
+        Returns the unit cost of calling a YouTube Data API method.
+
+        Args:
+            method (str): The API method, e.g. 'search.list'.
+            calls (int): How many times the method will be called.
+
+        Returns:
+            int: The total cost in quota units.
+        """
+        return QUOTA_COSTS[method] * calls
+
+    def spend(self, method, calls=1, priority=PRIORITY_USER):
+        """
+        Records the spend of a request if the budget allows it.
+
+        Callers must invoke this before executing the request and skip the request
+        when it returns False.
+
+        Args:
+            method (str): The API method, e.g. 'playlistItems.insert'.
+            calls (int): How many times the method will be called.
+            priority (str): One of PRIORITY_RESERVED, PRIORITY_USER or PRIORITY_BACKGROUND.
+
+        Returns:
+            bool: True if the units were recorded, False if the request must not run.
+        """
+        cost = self.cost(method, calls)
+        with self._lock:
+            self._roll_over()
+            if not self._allowed(cost, priority):
+                logger.warning("Deferred %s (%d units, %s priority), %d units left.",
+                               method, cost, priority, self._remaining())
+                return False
+            self._state['spent'] += cost
+            self._save()
+            return True
+
+    def mark_exhausted(self):
+        """
+        Marks the quota of the current day as fully spent.
+
+        Used when YouTube reports the quota as exceeded although the ledger did
+        not, e.g. when the quota is shared with another client of the same key.
+        """
+        with self._lock:
+            self._roll_over()
+            self._state['spent'] = max(self._state['spent'], self.daily_quota)
+            self._save()
+        logger.warning("YouTube reported the quota as exceeded, marked the day as exhausted.")
+
+    def record_http_error(self, error):
+        """
+        Inspects a failed YouTube request and marks the quota exhausted if needed.
+
+        Args:
+            error (googleapiclient.errors.HttpError): The error raised by the request.
+
+        Returns:
+            bool: True if the error was a quotaExceeded error.
+        """
+        content = getattr(error, 'content', b'') or b''
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        if getattr(error.resp, 'status', None) != 403 or 'quotaExceeded' not in content:
+            return False
+        self.mark_exhausted()
+        return True
+
+    def should_defer_background(self):
+        """
+        Tells whether background work should be postponed.
+
+        Returns:
+            bool: True if the budget is too low for background requests.
+        """
+        with self._lock:
+            self._roll_over()
+            return not self._allowed(0, PRIORITY_BACKGROUND)
+
+    def remaining(self):
+        """
+        Returns the quota units left for the current quota day.
+
+        Returns:
+            int: The remaining units.
+        """
+        with self._lock:
+            self._roll_over()
+            return self._remaining()
+
+    def predict_exhaustion(self):
+        """
+        Estimates when the quota will run out at the current burn rate.
+
+        Returns:
+            datetime or None: The predicted exhaustion time, or None if nothing has
+            been spent yet. A time after the next reset means the quota is expected
+            to last the whole day.
+        """
+        with self._lock:
+            self._roll_over()
+            return self._predict_exhaustion()
+
+    def next_reset(self):
+        """
+        Returns the time at which the daily quota resets.
+
+        Returns:
+            datetime: Next midnight Pacific Time.
+        """
+        with self._lock:
+            self._roll_over()
+            return self._next_reset()
+
+ledger = QuotaLedger(
+    PP_YT_QUOTA_FILE,
+    PP_YT_DAILY_QUOTA,
+    PP_YT_QUOTA_RESERVE,
+    PP_YT_QUOTA_BACKGROUND_FLOOR
+)